@@ -0,0 +1,96 @@
+"""导入耗时预算检查
+
+用 `python -X importtime` 在全新子进程中导入各模块，检查累计导入耗时是否超出预算，
+以及是否提前拉入了应当延迟导入的重依赖。
+
+子进程先导入 BASELINE_MODULES（几乎每个模块都会用到的标准库）再导入被测模块，
+预算只约束在此基线之上的增量，不随机器快慢的解释器与标准库开销浮动。
+
+用法（在项目根目录）：
+    python benchmarks/import_time.py [--repeat N]
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASELINE_MODULES = ("typing", "logging")
+
+# 模块 -> 基线之上的累计导入耗时预算（毫秒），留有数倍余量以适应较慢的 CI 主机
+IMPORT_BUDGETS_MS = {
+    "src.config": 20,
+    "src.llm_gateway": 40,
+    "src.profile": 40,
+    "src.main": 20,
+    "src.api": 600,  # aiohttp 自身导入占大头
+}
+
+# 这些包只应在首次处理消息或 prewarm 时导入
+DEFERRED_PACKAGES = ("langchain", "langchain_core", "langgraph", "chromadb", "langchain_chroma", "google")
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def _importtime(statement: str) -> List[Tuple[int, str, bool]]:
+    """在全新子进程中执行 statement，返回 (累计微秒, 模块名, 是否顶层导入) 列表"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"{statement} failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            rows.append((int(match.group(2)), match.group(4), len(match.group(3)) == 1))
+    return rows
+
+def measure_baseline() -> float:
+    """基线模块的累计导入耗时（毫秒），仅用于报告"""
+    rows = _importtime(f"import {', '.join(BASELINE_MODULES)}")
+    return sum(us for us, name, is_top in rows if is_top and name in BASELINE_MODULES) / 1000
+
+def measure(module: str) -> Tuple[float, List[str]]:
+    """返回模块在基线之上的累计导入耗时（毫秒）与被导入的重依赖顶层包"""
+    cumulative_us = None
+    heavy = set()
+    for us, name, is_top in _importtime(f"import {', '.join(BASELINE_MODULES)}; import {module}"):
+        if name == module and is_top:
+            cumulative_us = us
+        top = name.split(".")[0]
+        if top in DEFERRED_PACKAGES or name.startswith("google."):
+            heavy.add(top if top != "google" else ".".join(name.split(".")[:2]))
+    if cumulative_us is None:
+        raise RuntimeError(f"importtime 输出中未找到 {module}")
+    return cumulative_us / 1000, sorted(heavy)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="每个模块测量次数，取最小值")
+    parser.add_argument("modules", nargs="*", help="仅检查指定模块")
+    args = parser.parse_args(argv)
+
+    budgets: Dict[str, float] = {m: IMPORT_BUDGETS_MS[m] for m in (args.modules or IMPORT_BUDGETS_MS)}
+    failed = False
+    print(f"baseline ({', '.join(BASELINE_MODULES)}): {min(measure_baseline() for _ in range(args.repeat)):.1f} ms")
+    for module, budget in budgets.items():
+        try:
+            results = [measure(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"ERROR {module}: {e}")
+            failed = True
+            continue
+        elapsed = min(r[0] for r in results)
+        heavy = results[0][1]
+        ok = elapsed <= budget and not heavy
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {module:<18} {elapsed:8.1f} ms (budget {budget} ms over baseline)"
+              + (f"  eager heavy imports: {', '.join(heavy)}" if heavy else ""))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
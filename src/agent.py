@@ -1,6 +1,7 @@
 import re
 import json
 import logging
+from functools import lru_cache
 from typing import Dict, Any, Sequence
 from langchain.prompts import PromptTemplate
 from langchain_core.tools import render_text_description
@@ -8,21 +9,35 @@ from langchain_core.agents import AgentAction, AgentFinish
 from langchain_core.exceptions import OutputParserException
 from langchain.agents.output_parsers.react_single_input import ReActSingleInputOutputParser
 from langchain.agents.format_scratchpad import format_log_to_str
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.runnables import RunnablePassthrough
-from src.config import API_KEY, SAFETY_SETTINGS
-from src.tools import TOOLS
-from src.state import State, HumanMessage
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from src.config import API_KEY, configure_genai, get_safety_settings
+from src.llm_gateway import FOREGROUND, BACKGROUND, get_llm_gateway
+from src.state import State, LogEntry, ROLE_USER
 
 logger = logging.getLogger(__name__)
 
-llm = ChatGoogleGenerativeAI(
-    safety_settings=SAFETY_SETTINGS,
-    model="gemini-2.0-flash",
-    google_api_key=API_KEY,
-    temperature=0.5,
-    max_tokens=1500
-)
+# 提示词中携带的最近消息条数（不含当前问题）
+CHAT_HISTORY_WINDOW = 20
+
+@lru_cache(maxsize=None)
+def get_llm():
+    """首次使用时才构建 Gemini 客户端"""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    configure_genai()
+    return ChatGoogleGenerativeAI(
+        safety_settings=get_safety_settings(),
+        model="gemini-2.0-flash",
+        google_api_key=API_KEY,
+        temperature=0.5,
+        max_tokens=1500,
+        max_retries=1  # 重试交给 llm_gateway
+    )
+
+def gated_llm(caller: str, priority: int = BACKGROUND) -> RunnableLambda:
+    """经 llm_gateway 限流调度的 llm，可直接用于 `prompt | gated_llm(...)`"""
+    def invoke(prompt_value, config=None):
+        return get_llm_gateway().call(lambda: get_llm().invoke(prompt_value, config), caller=caller, priority=priority, prompt=prompt_value)
+    return RunnableLambda(invoke, name=f"llm:{caller}")
 
 custom_react_prompt = PromptTemplate.from_template("""
 你是羽汐，小名叫小羽，一个乐于助人的、活泼的人类女孩AI助手。尽力回答用户的问题，并在必要时使用可用工具。称呼自己用“咱”。
@@ -79,40 +94,42 @@ class TolerantReActSingleInputOutputParser(ReActSingleInputOutputParser):
 
 
 tolerant_parser = TolerantReActSingleInputOutputParser()
-tools_description = render_text_description(TOOLS)
-tool_names = ", ".join([t.name for t in TOOLS])
-
-def format_chat_history_for_prompt(chat_history: Sequence) -> str:
-    return "\n".join([f"{'用户' if isinstance(msg, HumanMessage) else '羽汐'}: {msg.content}" for msg in chat_history])
-
-agent_runnable = (
-    RunnablePassthrough.assign(
-        agent_scratchpad=lambda x: format_log_to_str(x.get("intermediate_steps", [])),
-        context=lambda x: x.get("current_context", ""),
-        current_time=lambda x: x.get("current_time", ""),
-        current_topic=lambda x: x.get("current_topic", ""),
-        chat_history=lambda x: format_chat_history_for_prompt(x.get("chat_history", [])),
-        input=lambda x: x.get("input", ""),
-        tools=lambda x: tools_description,
-        tool_names=lambda x: tool_names,
+
+def format_chat_history_for_prompt(chat_history: Sequence[LogEntry]) -> str:
+    return "\n".join([f"{'用户' if entry.role is ROLE_USER else '羽汐'}: {entry.content}" for entry in chat_history])
+
+@lru_cache(maxsize=None)
+def get_agent_runnable():
+    """首次运行 Agent 时才渲染工具描述并组装 runnable"""
+    from src.tools import TOOLS
+    tools_description = render_text_description(TOOLS)
+    tool_names = ", ".join([t.name for t in TOOLS])
+    return (
+        RunnablePassthrough.assign(
+            agent_scratchpad=lambda x: format_log_to_str(x.get("intermediate_steps", [])),
+            context=lambda x: x.get("current_context", ""),
+            current_time=lambda x: x.get("current_time", ""),
+            current_topic=lambda x: x.get("current_topic", ""),
+            chat_history=lambda x: format_chat_history_for_prompt(x.get("chat_history", [])),
+            input=lambda x: x.get("input", ""),
+            tools=lambda x: tools_description,
+            tool_names=lambda x: tool_names,
+        )
+        | custom_react_prompt
+        | gated_llm("agent", FOREGROUND)
+        | tolerant_parser
     )
-    | custom_react_prompt
-    | llm
-    | tolerant_parser
-)
 
 def prepare_agent_input(state: State) -> Dict[str, Any]:
-    messages = state.get("messages", [])
-    input_content = messages[-1].content if messages and isinstance(messages[-1], HumanMessage) else ""
-    chat_history_messages = messages[:-1] if messages and isinstance(messages[-1], HumanMessage) else messages
-    state["input"] = input_content
-    state["chat_history"] = chat_history_messages
+    entries = state["conversation"].recent(CHAT_HISTORY_WINDOW + 1)
+    pending = bool(entries) and entries[-1].role is ROLE_USER
+    state["input"] = entries[-1].content if pending else ""
     state["intermediate_steps"] = []
     state["agent_outcome"] = None
 
     return {
         "input": state["input"],
-        "chat_history": state["chat_history"],
+        "chat_history": entries[:-1] if pending else entries[-CHAT_HISTORY_WINDOW:],
         "intermediate_steps": state["intermediate_steps"],
         "current_context": state.get("current_context", ""),
         "current_time": state.get("current_time", ""),
@@ -124,7 +141,7 @@ def run_agent(state: State) -> Dict[str, Any]:
     logger.info(f"用户 {uid} 运行 Agent...")
     inputs = prepare_agent_input(state)
     try:
-        agent_outcome = agent_runnable.invoke(inputs)
+        agent_outcome = get_agent_runnable().invoke(inputs)
         return {"agent_outcome": agent_outcome}
     except Exception as e:
         logger.error(f"Agent 执行失败: {e}", exc_info=True)
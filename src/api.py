@@ -3,7 +3,9 @@ from aiohttp import web
 import asyncio
 import base64
 import logging
-from src.main import process_message, user_states
+from src.main import embed_queries, process_message, prewarm, user_states
+from src.config import PREWARM_UIDS, BATCH_MAX_ITEMS, BATCH_DEFAULT_CONCURRENCY, BATCH_MAX_CONCURRENCY
+from src.llm_gateway import get_llm_gateway
 from datetime import datetime
 
 logging.basicConfig(level=logging.INFO)
@@ -32,7 +34,7 @@ async def chat_handler(request: web.Request) -> web.Response:
             except Exception as e:
                 return web.json_response({"error": f"Invalid image data: {e}"}, status=400)
 
-        response = await asyncio.to_thread(process_message, uid, message, img_data_list, api_key)
+        response = await asyncio.to_thread(process_message, uid, message, img_data_list)
 
         log_output = "=== 实时日志 ===\n"
         current_state = user_states.get(uid, {})
@@ -78,18 +80,143 @@ async def chat_handler(request: web.Request) -> web.Response:
         logger.error(f"Error in chat_handler: {e}", exc_info=True)
         return web.json_response({"error": str(e)}, status=500)
 
+async def batch_handler(request: web.Request) -> web.StreamResponse:
+    """处理 POST /chat/batch 请求：批量嵌入全部查询后以有限并发处理，每完成一条即以 JSONL 返回"""
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        return web.json_response({"error": "Invalid JSON format"}, status=400)
+    if not isinstance(data, dict):
+        return web.json_response({"error": "请求体必须为 JSON 对象"}, status=400)
+    items = data.get("items")
+    if not data.get("api_key"):
+        return web.json_response({"error": "请提供 'api_key'"}, status=400)
+    if not isinstance(items, list) or not items:
+        return web.json_response({"error": "请提供非空的 'items' 列表"}, status=400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return web.json_response({"error": f"'items' 最多 {BATCH_MAX_ITEMS} 条"}, status=400)
+    if any(not isinstance(item, dict) or not item.get("uid") for item in items):
+        return web.json_response({"error": "每个条目都需提供 'uid'"}, status=400)
+    try:
+        concurrency = min(max(int(data.get("concurrency", BATCH_DEFAULT_CONCURRENCY)), 1), BATCH_MAX_CONCURRENCY)
+    except (TypeError, ValueError):
+        return web.json_response({"error": "'concurrency' 必须为整数"}, status=400)
+
+    messages = [item.get("message", "") for item in items]
+    try:
+        embeddings = await asyncio.to_thread(embed_queries, messages)
+    except Exception as e:
+        logger.warning(f"批量嵌入失败，回退为逐条嵌入: {e}")
+        embeddings = [None] * len(items)
+
+    # 同一用户的消息按顺序串行处理，不同用户之间并发
+    by_uid = {}
+    for index, item in enumerate(items):
+        by_uid.setdefault(item["uid"], []).append(index)
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson; charset=utf-8"})
+    await response.prepare(request)
+    semaphore = asyncio.Semaphore(concurrency)
+    write_lock = asyncio.Lock()
+
+    async def run_user(uid: str, indexes: list) -> None:
+        for index in indexes:
+            result = {"index": index, "uid": uid}
+            try:
+                async with semaphore:
+                    result["response"] = await asyncio.to_thread(process_message, uid, messages[index], [], query_embedding=embeddings[index])
+            except Exception as e:
+                logger.error(f"Batch item {index} for UID {uid} failed: {e}", exc_info=True)
+                result["error"] = str(e)
+            async with write_lock:
+                await response.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    await asyncio.gather(*(run_user(uid, indexes) for uid, indexes in by_uid.items()))
+    await response.write_eof()
+    return response
+
+def _memory_stores(uid: str):
+    """已加载的用户复用其状态中的存储，否则直接打开"""
+    from src.profile import ProfileStore
+    from src.state import open_vector_store, user_persist_dir
+    state = user_states.get(uid)
+    if state:
+        return state["vector_store"]["memory"], state["profile_store"]
+    return open_vector_store(uid), ProfileStore(user_persist_dir(uid))
+
+async def export_handler(request: web.Request) -> web.StreamResponse:
+    """处理 GET /memory/export 请求，以 JSONL 流式返回用户记忆"""
+    uid = request.query.get("uid")
+    if not uid:
+        return web.json_response({"error": "请提供 'uid'"}, status=400)
+    if not request.query.get("api_key"):
+        return web.json_response({"error": "请提供 'api_key'"}, status=400)
+    with_vectors = request.query.get("vectors", "").lower() in ("1", "true", "yes")
+    from src.transfer import iter_export_batches
+
+    vector_store, profile_store = await asyncio.to_thread(_memory_stores, uid)
+    batches = iter_export_batches(vector_store, profile_store, uid, with_vectors)
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson; charset=utf-8"})
+    await response.prepare(request)
+    while True:
+        batch = await asyncio.to_thread(next, batches, None)
+        if batch is None:
+            break
+        await response.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch).encode("utf-8"))
+    await response.write_eof()
+    return response
+
+async def import_handler(request: web.Request) -> web.Response:
+    """处理 POST /memory/import 请求，请求体为导出的 JSONL"""
+    uid = request.query.get("uid")
+    if not uid:
+        return web.json_response({"error": "请提供 'uid'"}, status=400)
+    if not request.query.get("api_key"):
+        return web.json_response({"error": "请提供 'api_key'"}, status=400)
+
+    from src.transfer import MemoryImporter
+    try:
+        vector_store, profile_store = await asyncio.to_thread(_memory_stores, uid)
+        importer = MemoryImporter(vector_store, profile_store)
+        async for line in request.content:
+            line = line.strip()
+            if not line:
+                continue
+            importer.feed(json.loads(line))
+            if importer.should_flush():
+                await asyncio.to_thread(importer.flush)
+        await asyncio.to_thread(importer.flush)
+        if uid in user_states:
+            # 缓存对象在该用户状态的各副本间共享，并发轮次写回状态也不会丢失失效
+            user_states[uid]["retrieval_cache"].invalidate()
+        return web.json_response({"uid": uid, "imported": importer.counts})
+    except (json.JSONDecodeError, ValueError) as e:
+        return web.json_response({"error": f"Invalid import data: {e}"}, status=400)
+    except Exception as e:
+        logger.error(f"Error in import_handler: {e}", exc_info=True)
+        return web.json_response({"error": str(e)}, status=500)
+
 async def status_handler(request: web.Request) -> web.Response:
     """处理 GET /status 请求"""
     return web.json_response({
         "status": "ok",
         "message": "HakusAI API is running",
-        "current_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "current_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "llm": get_llm_gateway().stats()
     })
 
+async def prewarm_on_startup(app: web.Application) -> None:
+    """服务启动时预热，避免首个请求承担冷启动开销"""
+    await asyncio.to_thread(prewarm, PREWARM_UIDS)
+
 app = web.Application()
+app.on_startup.append(prewarm_on_startup)
 app.add_routes([
     web.post('/chat', chat_handler),
+    web.post('/chat/batch', batch_handler),
     web.get('/status', status_handler),
+    web.get('/memory/export', export_handler),
+    web.post('/memory/import', import_handler),
 ])
 
 async def start_server():
@@ -1,22 +1,46 @@
 import os
-import google.generativeai as genai
-from google.generativeai import types as genai_types
+from functools import lru_cache
 
 # API 密钥配置
 API_KEY = ""
 SEARCH_API_KEY = ""
 SEARCH_CSE_ID = ""
 
-# 配置 Google Generative AI
-genai.configure(api_key=API_KEY)
+# 嵌入模型（导出文件记录该名称，导入时据此判断能否复用向量）
+EMBEDDING_MODEL = "models/text-embedding-004"
 
-# 安全设置
-SAFETY_SETTINGS = {
-    genai_types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: genai_types.HarmBlockThreshold.BLOCK_NONE,
-    genai_types.HarmCategory.HARM_CATEGORY_HARASSMENT: genai_types.HarmBlockThreshold.BLOCK_NONE,
-    genai_types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: genai_types.HarmBlockThreshold.BLOCK_NONE,
-    genai_types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: genai_types.HarmBlockThreshold.BLOCK_NONE,
-}
+# LLM 调用闸门：全局并发、每分钟 token 预算（0 为不限）与限流重试次数
+LLM_MAX_CONCURRENCY = 4
+LLM_TOKENS_PER_MINUTE = 0
+LLM_MAX_RETRIES = 5
+# 后台（记忆维护）调用排队超过该秒数后提升为前台优先级
+LLM_BACKGROUND_MAX_WAIT = 30.0
+
+# /chat/batch：单次请求最多条目数与默认、最大并发
+BATCH_MAX_ITEMS = 5000
+BATCH_DEFAULT_CONCURRENCY = 8
+BATCH_MAX_CONCURRENCY = 32
+
+# 启动时预热的用户（见 src.main.prewarm）
+PREWARM_UIDS = []
+
+# google SDK 导入较慢，配置与安全设置均在首次使用时才构建
+@lru_cache(maxsize=None)
+def configure_genai() -> None:
+    """配置 Google Generative AI"""
+    import google.generativeai as genai
+    genai.configure(api_key=API_KEY)
+
+@lru_cache(maxsize=None)
+def get_safety_settings() -> dict:
+    """安全设置"""
+    from google.generativeai import types as genai_types
+    return {
+        genai_types.HarmCategory.HARM_CATEGORY_HATE_SPEECH: genai_types.HarmBlockThreshold.BLOCK_NONE,
+        genai_types.HarmCategory.HARM_CATEGORY_HARASSMENT: genai_types.HarmBlockThreshold.BLOCK_NONE,
+        genai_types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: genai_types.HarmBlockThreshold.BLOCK_NONE,
+        genai_types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: genai_types.HarmBlockThreshold.BLOCK_NONE,
+    }
 
 # 可选：代理设置（根据需要启用）
 # os.environ["HTTP_PROXY"] = "http://127.0.0.1:7890"
\ No newline at end of file
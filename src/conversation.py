@@ -0,0 +1,54 @@
+import sys
+from typing import Iterator, List, Optional, Tuple
+
+ROLE_USER = sys.intern("user")
+ROLE_AI = sys.intern("ai")
+
+class LogEntry:
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = sys.intern(role)
+        self.content = content
+
+class ConversationLog:
+    """只追加的对话日志，每条消息只存一份；提示词所需的最近消息、问答轮次与历史文本均为其视图"""
+    __slots__ = ("_entries", "_turns")
+
+    def __init__(self):
+        self._entries: List[LogEntry] = []
+        # 已完成轮次中用户消息在 _entries 中的下标，第 i 轮即第 i 步
+        self._turns: List[int] = []
+
+    def append(self, role: str, content: str) -> None:
+        role = sys.intern(role)
+        if role is ROLE_AI and self._entries and self._entries[-1].role is ROLE_USER:
+            self._turns.append(len(self._entries) - 1)
+        self._entries.append(LogEntry(role, content))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def turn_count(self) -> int:
+        return len(self._turns)
+
+    @property
+    def last(self) -> Optional[LogEntry]:
+        return self._entries[-1] if self._entries else None
+
+    def recent(self, k: int) -> List[LogEntry]:
+        """最近 k 条消息"""
+        return self._entries[-k:] if k > 0 else []
+
+    def turns(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """按轮次切片的 (问, 答) 视图"""
+        entries = self._entries
+        for i in self._turns[start:stop]:
+            yield entries[i].content, entries[i + 1].content
+
+    def last_turns(self, k: int) -> List[Tuple[str, str]]:
+        return list(self.turns(-k)) if k > 0 else []
+
+    def history_text(self, k: int, template: str = "问: {query} 答: {response}", empty: str = "无历史") -> str:
+        return "\n".join([template.format(query=q, response=r) for q, r in self.last_turns(k)]) or empty
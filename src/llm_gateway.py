@@ -0,0 +1,200 @@
+import time
+import heapq
+import random
+import itertools
+import threading
+from collections import defaultdict, deque
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, TypeVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 优先级：数值越小越优先，面向用户的调用总是先于记忆维护调用
+FOREGROUND = 0
+BACKGROUND = 1
+
+TOKEN_WINDOW_SECONDS = 60.0
+# 后台调用排队超过该秒数后提升为前台优先级，避免在持续前台负载下饿死
+BACKGROUND_MAX_WAIT_SECONDS = 30.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "BadGateway", "GatewayTimeout",
+}
+
+def estimate_tokens(prompt: Any) -> int:
+    """粗略估算 token 数（中文约 1-2 字符一个 token）"""
+    if prompt is None:
+        return 1
+    text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+    return len(text) // 2 + 1
+
+def is_retryable(error: BaseException) -> bool:
+    """判断是否为限流或服务端错误（429/5xx）"""
+    for attr in ("code", "status_code", "status"):
+        code = getattr(error, attr, None)
+        if isinstance(code, int):
+            return code in RETRYABLE_STATUS_CODES
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage_metadata", None)
+    if isinstance(usage, dict) and usage.get("total_tokens"):
+        return int(usage["total_tokens"])
+    return None
+
+class LLMGateway:
+    """共享的 LLM 调用闸门：全局并发与每分钟 token 预算、按优先级排队、限流退避重试、按调用方统计"""
+
+    def __init__(self, max_concurrency: int = 4, tokens_per_minute: int = 0, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 30.0, reserved_foreground: int = 1,
+                 background_max_wait: float = BACKGROUND_MAX_WAIT_SECONDS, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # 为前台调用预留的并发槽位，后台调用不能占满全部槽位
+        self.reserved_foreground = min(reserved_foreground, max_concurrency - 1)
+        self.background_max_wait = background_max_wait
+        self._clock = clock
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._token_log = deque()
+        self._tokens_in_window = 0
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "retries": 0, "failures": 0, "tokens": 0, "wait_seconds": 0.0}
+        )
+
+    def _prune_tokens(self, now: float) -> None:
+        while self._token_log and self._token_log[0][0] <= now - TOKEN_WINDOW_SECONDS:
+            self._tokens_in_window -= self._token_log.popleft()[1]
+
+    def _budget_wait(self, tokens: int, now: float) -> float:
+        """返回需要等待的秒数，0 表示预算充足"""
+        if not self.tokens_per_minute:
+            return 0.0
+        self._prune_tokens(now)
+        # 窗口为空时允许单次超预算请求，避免永久阻塞
+        if not self._token_log or self._tokens_in_window + tokens <= self.tokens_per_minute:
+            return 0.0
+        return max(self._token_log[0][0] + TOKEN_WINDOW_SECONDS - now, 0.01)
+
+    def _record_tokens(self, tokens: int, now: float) -> None:
+        if self.tokens_per_minute and tokens:
+            self._token_log.append((now, tokens))
+            self._tokens_in_window += tokens
+
+    def _slot_available(self, priority: int) -> bool:
+        limit = self.max_concurrency if priority <= FOREGROUND else self.max_concurrency - self.reserved_foreground
+        return self._active < limit
+
+    def _promote_aged(self, now: float) -> None:
+        """排队过久的后台调用提升为前台优先级"""
+        promoted = False
+        for ticket in self._waiting:
+            if ticket[0] > FOREGROUND and now - ticket[2] >= self.background_max_wait:
+                ticket[0] = FOREGROUND
+                promoted = True
+        if promoted:
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    def _acquire(self, priority: int, tokens: int) -> None:
+        # ticket: [优先级, 序号, 入队时间]，优先级可能因排队过久被提升
+        ticket = [priority, next(self._seq), self._clock()]
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = self._clock()
+                    self._promote_aged(now)
+                    timeout = None
+                    if self._waiting[0] is ticket and self._slot_available(ticket[0]):
+                        timeout = self._budget_wait(tokens, now)
+                        if not timeout:
+                            break
+                    if ticket[0] > FOREGROUND:
+                        age_timeout = max(ticket[2] + self.background_max_wait - now, 0.01)
+                        timeout = min(timeout, age_timeout) if timeout else age_timeout
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._active += 1
+            self._record_tokens(tokens, self._clock())
+            self._cond.notify_all()
+
+    def _release(self, estimated: int, actual: Optional[int]) -> None:
+        with self._cond:
+            self._active -= 1
+            if actual is not None and actual != estimated:
+                self._record_tokens(actual - estimated, self._clock())
+            self._cond.notify_all()
+
+    def backoff_delay(self, attempt: int) -> float:
+        """指数退避加全抖动"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn: Callable[[], T], caller: str = "default", priority: int = BACKGROUND,
+             prompt: Any = None, estimated_tokens: Optional[int] = None) -> T:
+        tokens = estimated_tokens or estimate_tokens(prompt)
+        attempt = 0
+        while True:
+            start = self._clock()
+            self._acquire(priority, tokens)
+            waited = self._clock() - start
+            result = None
+            try:
+                try:
+                    result = fn()
+                finally:
+                    # 任何异常（包括 KeyboardInterrupt 等 BaseException）都要归还槽位
+                    self._release(tokens, _usage_tokens(result))
+            except Exception as e:
+                with self._cond:
+                    stats = self._stats[caller]
+                    stats["wait_seconds"] += waited
+                    retry = is_retryable(e) and attempt < self.max_retries
+                    stats["retries" if retry else "failures"] += 1
+                if not retry:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"LLM 调用 {caller} 被限流或服务端出错，{delay:.2f}s 后第 {attempt + 1} 次重试: {e}")
+                self._sleep(delay)
+                attempt += 1
+                continue
+            actual = _usage_tokens(result)
+            with self._cond:
+                stats = self._stats[caller]
+                stats["calls"] += 1
+                stats["tokens"] += actual if actual is not None else tokens
+                stats["wait_seconds"] += waited
+            return result
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._cond:
+            return {caller: dict(stats) for caller, stats in self._stats.items()}
+
+@lru_cache(maxsize=None)
+def get_llm_gateway() -> LLMGateway:
+    """进程内共享的 LLM 调用闸门"""
+    from src.config import LLM_MAX_CONCURRENCY, LLM_TOKENS_PER_MINUTE, LLM_MAX_RETRIES, LLM_BACKGROUND_MAX_WAIT
+    return LLMGateway(
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+        max_retries=LLM_MAX_RETRIES,
+        background_max_wait=LLM_BACKGROUND_MAX_WAIT
+    )
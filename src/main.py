@@ -1,13 +1,41 @@
-from src.workflow import graph
-from src.state import State, initialize_state
-from src.agent import llm
-from langchain_core.messages import HumanMessage, AIMessage
+from typing import Iterable, List, Optional
 import logging
 
+# langchain/langgraph/chroma 等重依赖在首次处理消息（或 prewarm）时才导入，
+# 使 `import src.main` 与测试进程启动保持轻量
 logger = logging.getLogger(__name__)
 user_states = {}
 
-def process_message(uid: str, message: str, img_data_list: list = []) -> str:
+def prewarm(uids: Iterable[str] = ()) -> None:
+    """预热：提前完成重依赖导入、客户端构建与图编译，并可预先加载指定用户状态"""
+    from src.agent import get_llm, get_agent_runnable
+    from src.state import get_embedding_function, initialize_state
+    from src.workflow import get_graph
+
+    get_llm()
+    get_agent_runnable()
+    get_embedding_function()
+    get_graph()
+    for uid in uids:
+        if uid not in user_states:
+            user_states[uid] = initialize_state(uid)
+    logger.info("HakusAI prewarm finished")
+
+def embed_queries(messages: List[str], embedding_function=None) -> List[Optional[List[float]]]:
+    """一次嵌入调用为多条查询生成向量，空消息返回 None"""
+    if embedding_function is None:
+        from src.state import get_embedding_function
+        embedding_function = get_embedding_function()
+    texts = [m for m in messages if m]
+    if not texts:
+        return [None] * len(messages)
+    vectors = iter(embedding_function.embed_documents(texts, task_type="RETRIEVAL_QUERY"))
+    return [next(vectors) if m else None for m in messages]
+
+def process_message(uid: str, message: str, img_data_list: list = [], *, query_embedding: Optional[List[float]] = None) -> str:
+    from src.workflow import get_graph
+    from src.state import initialize_state, ROLE_AI
+
     if uid not in user_states:
         user_states[uid] = initialize_state(uid)
         logger.info(f"Initialized state for user {uid} via initialize_state")
@@ -15,16 +43,16 @@ def process_message(uid: str, message: str, img_data_list: list = []) -> str:
     state = user_states[uid]
     state["current_query"] = message
     state["img_data_list"] = img_data_list
-    state["messages"].append(HumanMessage(content=message))
+    state["query_embedding"] = query_embedding
 
     try:
-        final_state = graph.invoke(state)
+        final_state = get_graph().invoke(state)
         user_states[uid] = final_state
-        if not final_state["messages"] or not isinstance(final_state["messages"][-1], AIMessage):
-            logger.error(f"Last message is not an AIMessage: {final_state['messages']}")
+        last_entry = final_state["conversation"].last
+        if last_entry is None or last_entry.role is not ROLE_AI:
+            logger.error(f"Last message is not an AI response: {last_entry and last_entry.content}")
             return "处理出错: Agent 未正确响应"
-        response = final_state["messages"][-1].content
-        return response
+        return last_entry.content
     except Exception as e:
         logger.error(f"Graph 执行失败: {e}", exc_info=True)
-        return f"处理出错: {str(e)}"
\ No newline at end of file
+        return f"处理出错: {str(e)}"
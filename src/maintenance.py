@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 达到最少数量且距上次运行超过防抖间隔才触发；积压达到批大小时立即触发；
+# 有积压但长时间（reflection_interval 天）未运行时兜底触发
+CONSOLIDATION_MIN_TURNS = 5
+REFLECTION_MIN_OBSERVATIONS = 3
+MAINTENANCE_DEBOUNCE_SECONDS = 300
+CONSOLIDATION_BATCH_TURNS = 20
+REFLECTION_BATCH_SIZE = 50
+# 单次反思最多处理的批数（每批一次 LLM 调用），其余积压留到后续轮次
+REFLECTION_MAX_BATCHES = 4
+SCAN_PAGE_SIZE = 1000
+# 记忆元数据中的写入序号（由 ProfileStore.reserve_sequence 分配，单调递增且唯一）。
+# 反思游标按序号而非时间戳推进：时间戳只有秒级精度，且导入的记忆时间戳早于游标
+WRITE_SEQ_KEY = "seq"
+
+def _elapsed_seconds(current_time: str, last_time: str) -> float:
+    return (datetime.strptime(current_time, TIME_FORMAT) - datetime.strptime(last_time, TIME_FORMAT)).total_seconds()
+
+def _due(pending: int, min_pending: int, batch_size: int, elapsed: float, idle_seconds: float) -> bool:
+    if pending <= 0:
+        return False
+    if pending >= batch_size:
+        return True
+    if pending >= min_pending and elapsed >= MAINTENANCE_DEBOUNCE_SECONDS:
+        return True
+    return elapsed >= idle_seconds
+
+def should_consolidate(state: Dict[str, Any]) -> bool:
+    pending = state["current_step"] - state["last_consolidation"]
+    elapsed = _elapsed_seconds(state["current_time"], state["last_consolidation_time"])
+    idle_seconds = state.get("reflection_interval", 1) * 24 * 3600
+    return _due(pending, CONSOLIDATION_MIN_TURNS, CONSOLIDATION_BATCH_TURNS, elapsed, idle_seconds)
+
+def should_reflect(state: Dict[str, Any]) -> bool:
+    pending = state.get("new_observations", 0)
+    elapsed = _elapsed_seconds(state["current_time"], state["last_reflection_time"])
+    idle_seconds = state.get("reflection_interval", 1) * 24 * 3600
+    return _due(pending, REFLECTION_MIN_OBSERVATIONS, REFLECTION_BATCH_SIZE, elapsed, idle_seconds)
+
+def batched(items: Sequence[Any], batch_size: int) -> Iterator[Sequence[Any]]:
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def _cursor_filter(cursor: int, exclude_types: Sequence[str]) -> Dict[str, Any]:
+    seq_filter = {WRITE_SEQ_KEY: {"$gt": cursor}}
+    if not exclude_types:
+        return seq_filter
+    return {"$and": [seq_filter, {"type": {"$nin": list(exclude_types)}}]}
+
+def _write_seq(metadata: Optional[Dict[str, Any]]) -> int:
+    return int((metadata or {}).get(WRITE_SEQ_KEY, 0))
+
+def plan_since(vector_store, cursor: int, batch_size: int = REFLECTION_BATCH_SIZE,
+               max_batches: int = REFLECTION_MAX_BATCHES,
+               exclude_types: Sequence[str] = ("insight",)) -> Tuple[List[List[str]], int]:
+    """仅按元数据扫描写入序号大于游标的记忆（不做嵌入与向量检索），按序号升序划分为至多 max_batches 批 id。
+
+    Chroma 的 get() 分页无序，因此先取全部待处理记录的序号再全局排序；序号唯一，
+    调用方处理完返回的批次后可把游标推进到其中最大的序号。返回 (id 批次, 本次未处理的剩余条数)。
+    """
+    where = _cursor_filter(cursor, exclude_types)
+    pending = []
+    offset = 0
+    while True:
+        result = vector_store.get(where=where, limit=SCAN_PAGE_SIZE, offset=offset, include=["metadatas"])
+        ids = result["ids"]
+        if not ids:
+            break
+        pending.extend((_write_seq(metadata), doc_id) for doc_id, metadata in zip(ids, result["metadatas"]))
+        offset += len(ids)
+    pending.sort()
+
+    selected = pending[:batch_size * max_batches]
+    batches = [[doc_id for _, doc_id in selected[start:start + batch_size]] for start in range(0, len(selected), batch_size)]
+    return batches, len(pending) - len(selected)
+
+def fetch_records(vector_store, ids: List[str]) -> List[Dict[str, Any]]:
+    """按 id 取回文档与元数据，按写入序号升序返回"""
+    result = vector_store.get(ids=ids, include=["documents", "metadatas"])
+    records = [
+        {"id": doc_id, "document": result["documents"][i], "metadata": result["metadatas"][i] or {}}
+        for i, doc_id in enumerate(result["ids"])
+    ]
+    records.sort(key=lambda r: _write_seq(r["metadata"]))
+    return records
+
+def max_write_seq(records: Sequence[Dict[str, Any]], cursor: int) -> int:
+    """处理完一批记录后的新游标"""
+    return max([cursor] + [_write_seq(r["metadata"]) for r in records])
@@ -1,9 +1,14 @@
 import uuid
 from datetime import datetime
+from typing import List
 from langchain.prompts import PromptTemplate
 from langchain.schema import Document
 from src.state import State
-from src.agent import llm
+from src.profile import INTENT_PROFILE_KEYS, parse_profile_item
+from src.retrieval_cache import retrieval_cache_keys
+from src.maintenance import CONSOLIDATION_BATCH_TURNS, REFLECTION_BATCH_SIZE, REFLECTION_MAX_BATCHES, WRITE_SEQ_KEY, batched, fetch_records, max_write_seq, plan_since
+from src.agent import gated_llm
+from src.llm_gateway import FOREGROUND
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +19,13 @@ EMOTION_INTENSITY = {
     "无所谓": 0.1, "随便": 0.1, "一般": 0.2
 }
 
+def _add_memories(state: State, docs: List[Document]) -> None:
+    """写入记忆，每条带上单调递增的写入序号供反思游标使用"""
+    for doc, seq in zip(docs, state["profile_store"].reserve_sequence(len(docs))):
+        doc.metadata[WRITE_SEQ_KEY] = seq
+    state["vector_store"]["memory"].add_documents(docs)
+    state["retrieval_cache"].invalidate()
+
 def memory_retrieval(state: State) -> State:
     query = state["current_query"]
     uid = state["uid"]
@@ -37,8 +49,8 @@ def memory_retrieval(state: State) -> State:
 - general_chat
 """
     )
-    chain = intent_prompt | llm
-    history_text = "\n".join([f"问: {h['query']} 答: {h['response']}" for h in state["history"][-3:]]) or "无历史"
+    chain = intent_prompt | gated_llm("intent", FOREGROUND)
+    history_text = state["conversation"].history_text(3)
     result = chain.invoke({"query": query, "history": history_text}).content.strip()
     intent = result.split("意图：")[1].split("\n")[0].strip() if "意图：" in result else "general_chat"
     topic = result.split("主题：")[1].strip() if "主题：" in result else "未知"
@@ -49,14 +61,45 @@ def memory_retrieval(state: State) -> State:
         "confirm_info": 3, "request_action": 4, "request_info": 4, "general_chat": 5
     }
     k = k_map.get(intent, 5)
-    initial_retrieve_k = max(k * 2, 10)
-    current_time_ts = datetime.strptime(state["current_time"], "%Y-%m-%d %H:%M:%S").timestamp()
-    one_month_ago = current_time_ts - 30 * 24 * 3600
+    profile_store = state["profile_store"]
+    profile_docs = [
+        Document(page_content=f"个人信息: {entry.key}={entry.value}", metadata={"type": "personal_info", "timestamp": entry.timestamp, "step": entry.step})
+        for entry in (profile_store.get(key) for key in INTENT_PROFILE_KEYS.get(intent, []))
+        if entry is not None
+    ]
+
+    if profile_docs:
+        # 档案可直接回答，跳过向量检索
+        logger.info(f"用户 {uid} 意图 {intent} 由个人档案直接回答")
+        state["retrieved_memory"] = profile_docs
+    else:
+        # 同一话题的后续轮次且期间无记忆写入时直接复用上次检索结果，跳过嵌入与向量检索
+        cache_keys = retrieval_cache_keys(state["retrieval_cache"], query, topic, intent)
+        cached = state["retrieval_cache"].lookup(cache_keys)
+        if cached is not None:
+            logger.info(f"用户 {uid} 命中检索缓存: 意图={intent} 主题={topic}")
+            state["retrieved_memory"] = list(cached)
+        else:
+            initial_retrieve_k = max(k * 2, 10)
+            current_time_ts = datetime.strptime(state["current_time"], "%Y-%m-%d %H:%M:%S").timestamp()
+            one_month_ago = current_time_ts - 30 * 24 * 3600
+
+            vector_store = state["vector_store"]["memory"]
+            query_embedding = state.get("query_embedding")
+            if query_embedding:
+                # 批量接口已预先嵌入查询，省去单独的嵌入调用
+                retrieved_with_scores = vector_store.similarity_search_by_vector_with_relevance_scores(query_embedding, k=initial_retrieve_k)
+            else:
+                retrieved_with_scores = vector_store.similarity_search_with_score(query, k=initial_retrieve_k)
+            filtered_retrieved = [doc for doc, score in retrieved_with_scores if float(doc.metadata.get("timestamp", 0)) >= one_month_ago]
+            state["retrieved_memory"] = filtered_retrieved[:k]
+            state["retrieval_cache"].store(cache_keys, tuple(state["retrieved_memory"]))
 
-    retrieved_with_scores = state["vector_store"]["memory"].similarity_search_with_score(query, k=initial_retrieve_k)
-    filtered_retrieved = [doc for doc, score in retrieved_with_scores if float(doc.metadata.get("timestamp", 0)) >= one_month_ago]
-    state["retrieved_memory"] = filtered_retrieved[:k]
-    state["current_context"] = "\n".join([f"- {doc.page_content}" for doc in state["retrieved_memory"]]) or "无相关记忆"
+    context_lines = [f"- {doc.page_content}" for doc in state["retrieved_memory"]]
+    # 由档案直接回答时检索结果已是档案条目，不再重复注入
+    if len(profile_store) and not profile_docs:
+        context_lines.insert(0, f"个人档案: {profile_store.format()}")
+    state["current_context"] = "\n".join(context_lines) or "无相关记忆"
     if state["image_description"]:
         state["current_context"] += f"\n图片描述: {state['image_description']}"
     return state
@@ -81,8 +124,8 @@ def extract_memory(state: State) -> State:
 4. 格式：`个人信息: 类型1=内容1 | 偏好: 内容1 | 习惯: 内容1 | 情感: 内容1 | 行为: 内容1`
 """
     )
-    chain = extract_prompt | llm
-    history_text = "\n".join([f"问: {h['query']} 答: {h['response']}" for h in state["history"][-3:]]) or "无历史"
+    chain = extract_prompt | gated_llm("extract_memory")
+    history_text = state["conversation"].history_text(3)
     result = chain.invoke({
         "query": state["current_query"],
         "response": state["response"],
@@ -109,6 +152,9 @@ def extract_memory(state: State) -> State:
             if category == "个人信息":
                 for item in contents:
                     docs_to_add.append(Document(page_content=f"个人信息: {item}", metadata={**metadata_base, "type": "personal_info"}))
+                    parsed = parse_profile_item(item)
+                    if parsed:
+                        state["profile_store"].set(parsed[0], parsed[1], current_time_ts, state["current_step"])
             elif category == "偏好":
                 for item in contents:
                     docs_to_add.append(Document(page_content=f"偏好: {item}", metadata={**metadata_base, "type": "preference"}))
@@ -126,7 +172,7 @@ def extract_memory(state: State) -> State:
             continue  # 跳过格式错误的 part，避免整个流程中断
 
     if docs_to_add:
-        state["vector_store"]["memory"].add_documents(docs_to_add)
+        _add_memories(state, docs_to_add)
         state["new_observations"] += len(docs_to_add)
         logger.info(f"用户 {uid} 添加了 {len(docs_to_add)} 条记忆")
     else:
@@ -136,9 +182,10 @@ def extract_memory(state: State) -> State:
 
 def consolidation(state: State) -> State:
     uid = state["uid"]
-    new_history = state["history"][state["last_consolidation"]:]
+    new_history = list(state["conversation"].turns(state["last_consolidation"]))
     if not new_history:
         state["last_consolidation"] = state["current_step"]
+        state["last_consolidation_time"] = state["current_time"]
         return state
 
     prompt = PromptTemplate(
@@ -154,40 +201,54 @@ def consolidation(state: State) -> State:
 或 "无"
 """
     )
-    chain = prompt | llm
-    history_text = "\n".join([f"[{h['query']} -> {h['response']}]" for h in new_history])
-    result = chain.invoke({"history": history_text, "current_time": state["current_time"]}).content.strip()
-
-    if result.lower() == "无":
-        state["last_consolidation"] = state["current_step"]
-        return state
-
-    observations = [obs[2:].strip() for obs in result.split("\n") if obs.startswith("- ")]
-    docs_to_add = []
+    chain = prompt | gated_llm("consolidation")
     current_time_ts = datetime.strptime(state["current_time"], "%Y-%m-%d %H:%M:%S").timestamp()
-    for obs in observations:
-        if obs:
-            docs_to_add.append(Document(page_content=obs, metadata={"type": "observation", "timestamp": current_time_ts, "step": state["current_step"], "usage_count": 0}))
+    docs_to_add = []
+    # 自上次巩固以来的全部对话按批处理，LLM 调用次数随新增对话量增长
+    for batch in batched(new_history, CONSOLIDATION_BATCH_TURNS):
+        history_text = "\n".join([f"[{query} -> {response}]" for query, response in batch])
+        result = chain.invoke({"history": history_text, "current_time": state["current_time"]}).content.strip()
+        if result.lower() == "无":
+            continue
+        observations = [obs[2:].strip() for obs in result.split("\n") if obs.startswith("- ")]
+        for obs in observations:
+            if obs:
+                docs_to_add.append(Document(page_content=obs, metadata={"type": "observation", "timestamp": current_time_ts, "step": state["current_step"], "usage_count": 0}))
 
     if docs_to_add:
-        state["vector_store"]["memory"].add_documents(docs_to_add)
+        _add_memories(state, docs_to_add)
         state["new_observations"] += len(docs_to_add)
+        logger.info(f"用户 {uid} 巩固了 {len(new_history)} 轮对话，新增 {len(docs_to_add)} 条观察")
     state["last_consolidation"] = state["current_step"]
+    state["last_consolidation_time"] = state["current_time"]
     return state
 
+def _parse_reflection(result: str) -> List[str]:
+    insights = []
+    contradictions = []
+    current_section = None
+    for line in result.split("\n"):
+        if line.strip().startswith("洞察总结:"):
+            current_section = "insights"
+        elif line.strip().startswith("发现的矛盾:"):
+            current_section = "contradictions"
+        elif current_section == "insights" and line.strip().startswith("- "):
+            insights.append(line.strip()[2:])
+        elif current_section == "contradictions" and line.strip().startswith("- "):
+            contradictions.append(line.strip()[2:])
+    if "无" in insights:
+        return []
+    return insights
+
 def reflection(state: State) -> State:
     uid = state["uid"]
+    vector_store = state["vector_store"]["memory"]
     current_time_ts = datetime.strptime(state["current_time"], "%Y-%m-%d %H:%M:%S").timestamp()
-    reflection_docs = state["vector_store"]["memory"].similarity_search("", k=10, filter={"step": {"$gt": state.get("last_reflection", -1)}})
-
-    if not reflection_docs:
-        state["new_observations"] = 0
-        state["last_reflection"] = state["current_step"]
-        state["last_reflection_time"] = state["current_time"]
-        return state
-
-    history_text = "\n".join([f"问: {h['query']} 答: {h['response']}" for h in state["history"][-10:]]) or "无历史"
-    observations_text = "\n".join([f"- {doc.page_content}" for doc in reflection_docs])
+    profile_store = state["profile_store"]
+    cursor = state.get("reflection_cursor")
+    if cursor is None:
+        # 进程重启后从档案库恢复游标（已反思到的最大写入序号）
+        cursor = profile_store.get_meta("reflection_seq", 0)
 
     prompt = PromptTemplate(
         input_variables=["observations", "history", "current_time", "emotion_dict"],
@@ -207,36 +268,38 @@ def reflection(state: State) -> State:
 或 "无"
 """
     )
-    chain = prompt | llm
-    result = chain.invoke({
-        "observations": observations_text,
-        "history": history_text,
-        "current_time": state["current_time"],
-        "emotion_dict": str(EMOTION_INTENSITY)
-    }).content.strip()
-
-    insights = []
-    contradictions = []
-    current_section = None
-    for line in result.split("\n"):
-        if line.strip().startswith("洞察总结:"):
-            current_section = "insights"
-        elif line.strip().startswith("发现的矛盾:"):
-            current_section = "contradictions"
-        elif current_section == "insights" and line.strip().startswith("- "):
-            insights.append(line.strip()[2:])
-        elif current_section == "contradictions" and line.strip().startswith("- "):
-            contradictions.append(line.strip()[2:])
+    chain = prompt | gated_llm("reflection")
+    history_text = state["conversation"].history_text(10)
 
+    new_cursor = cursor
     docs_to_add = []
-    if insights and "无" not in insights:
-        for insight in insights:
+    scanned = 0
+    # 游标之后写入的记忆按写入序号升序分批处理，每批一次 LLM 调用，单次最多 REFLECTION_MAX_BATCHES 批
+    id_batches, remaining = plan_since(vector_store, cursor, REFLECTION_BATCH_SIZE, REFLECTION_MAX_BATCHES)
+    for ids in id_batches:
+        batch = fetch_records(vector_store, ids)
+        scanned += len(batch)
+        new_cursor = max_write_seq(batch, new_cursor)
+        observations_text = "\n".join([f"- {r['document']}" for r in batch])
+        result = chain.invoke({
+            "observations": observations_text,
+            "history": history_text,
+            "current_time": state["current_time"],
+            "emotion_dict": str(EMOTION_INTENSITY)
+        }).content.strip()
+        for insight in _parse_reflection(result):
             docs_to_add.append(Document(page_content=insight, metadata={"type": "insight", "timestamp": current_time_ts, "step": state["current_step"], "usage_count": 0}))
 
     if docs_to_add:
-        state["vector_store"]["memory"].add_documents(docs_to_add)
+        _add_memories(state, docs_to_add)
+    if scanned:
+        logger.info(f"用户 {uid} 反思了 {scanned} 条新记忆，生成 {len(docs_to_add)} 条洞察，剩余 {remaining} 条待处理")
 
+    if new_cursor != cursor:
+        profile_store.set_meta("reflection_seq", new_cursor)
+    state["reflection_cursor"] = new_cursor
     state["last_reflection"] = state["current_step"]
     state["last_reflection_time"] = state["current_time"]
-    state["new_observations"] = 0
-    return state
\ No newline at end of file
+    # 未处理完的积压计入待反思数量，由调度器在后续轮次继续处理
+    state["new_observations"] = remaining
+    return state
@@ -0,0 +1,153 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Any, Dict, List, NamedTuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DB_FILENAME = "profile.sqlite3"
+WRITE_SEQ_META = "write_seq"
+
+# LLM 提取出的个人信息类型名不统一，写入前归一化为规范键
+PROFILE_KEY_ALIASES = {
+    "名字": "姓名", "名称": "姓名", "真名": "姓名", "全名": "姓名",
+    "小名": "昵称", "外号": "昵称", "称呼": "昵称",
+    "位置": "所在地", "地点": "所在地", "地址": "所在地", "住址": "所在地",
+    "居住地": "所在地", "城市": "所在地", "所在城市": "所在地", "居住城市": "所在地",
+}
+
+# 可直接由档案回答的意图及其对应的键（按优先级排列）
+INTENT_PROFILE_KEYS = {
+    "ask_personal_info_name": ["姓名", "昵称"],
+    "ask_personal_info_location": ["所在地"],
+}
+
+class ProfileEntry(NamedTuple):
+    key: str
+    value: str
+    timestamp: float
+    step: int
+
+def normalize_profile_key(key: str) -> str:
+    key = key.strip().strip("`").strip()
+    return PROFILE_KEY_ALIASES.get(key, key)
+
+def parse_profile_item(item: str) -> Optional[tuple]:
+    """解析 `类型=内容` 格式的个人信息条目，格式不符返回 None"""
+    if "=" not in item:
+        return None
+    key, value = item.split("=", 1)
+    key = normalize_profile_key(key)
+    value = value.strip().strip("`").strip()
+    if not key or not value:
+        return None
+    return key, value
+
+class ProfileStore:
+    """用户档案：键值对存储，最后写入为准并保留历史，存放于向量库同目录的 sqlite 文件"""
+
+    def __init__(self, persist_dir: str):
+        self.path = os.path.join(persist_dir, PROFILE_DB_FILENAME)
+        self._lock = threading.Lock()
+        self._current: Dict[str, ProfileEntry] = {}
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS profile ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, timestamp REAL NOT NULL, step INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS profile_history ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "timestamp REAL NOT NULL, step INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_profile_history_key ON profile_history (key)")
+            # 与档案同库存放的少量用户级元数据，如反思游标
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            for key, value, timestamp, step in conn.execute("SELECT key, value, timestamp, step FROM profile"):
+                self._current[key] = ProfileEntry(key, value, timestamp, step)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def set(self, key: str, value: str, timestamp: float, step: int) -> ProfileEntry:
+        """写入一条档案记录并返回该键当前生效的条目。
+
+        只有时间戳不早于现有值时才更新当前值（导入旧备份不会覆盖新值）；
+        完全相同的历史记录只保留一份，重复导入同一文件不会产生重复历史。
+        """
+        key = normalize_profile_key(key)
+        entry = ProfileEntry(key, value, float(timestamp), int(step))
+        with self._lock:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT INTO profile_history (key, value, timestamp, step) SELECT ?, ?, ?, ? "
+                    "WHERE NOT EXISTS (SELECT 1 FROM profile_history "
+                    "WHERE key = ? AND value = ? AND timestamp = ? AND step = ?)",
+                    entry + entry,
+                )
+                conn.execute(
+                    "INSERT INTO profile (key, value, timestamp, step) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                    "timestamp = excluded.timestamp, step = excluded.step "
+                    "WHERE excluded.timestamp >= profile.timestamp",
+                    entry,
+                )
+            current = self._current.get(key)
+            if current is None or entry.timestamp >= current.timestamp:
+                self._current[key] = current = entry
+        return current
+
+    def get(self, key: str) -> Optional[ProfileEntry]:
+        return self._current.get(normalize_profile_key(key))
+
+    def entries(self) -> List[ProfileEntry]:
+        # 导入可能在工作线程中并发写入，迭代前在锁内取快照
+        with self._lock:
+            return list(self._current.values())
+
+    def history(self, key: Optional[str] = None) -> List[ProfileEntry]:
+        """按写入顺序返回历史记录，可按键过滤"""
+        with closing(self._connect()) as conn:
+            if key is None:
+                rows = conn.execute("SELECT key, value, timestamp, step FROM profile_history ORDER BY id")
+            else:
+                rows = conn.execute(
+                    "SELECT key, value, timestamp, step FROM profile_history WHERE key = ? ORDER BY id",
+                    (normalize_profile_key(key),),
+                )
+            return [ProfileEntry(*row) for row in rows]
+
+    def get_meta(self, name: str, default: Any = None) -> Any:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    @staticmethod
+    def _write_meta(conn: sqlite3.Connection, name: str, value: Any) -> None:
+        conn.execute(
+            "INSERT INTO meta (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, json.dumps(value)),
+        )
+
+    def set_meta(self, name: str, value: Any) -> None:
+        with self._lock:
+            with closing(self._connect()) as conn, conn:
+                self._write_meta(conn, name, value)
+
+    def reserve_sequence(self, count: int) -> range:
+        """预留 count 个单调递增的记忆写入序号，计数持久化在 meta 表中"""
+        with self._lock:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute("SELECT value FROM meta WHERE name = ?", (WRITE_SEQ_META,)).fetchone()
+                start = (json.loads(row[0]) if row else 0) + 1
+                self._write_meta(conn, WRITE_SEQ_META, start + count - 1)
+        return range(start, start + count)
+
+    def format(self) -> str:
+        return "; ".join(f"{entry.key}={entry.value}" for entry in self.entries())
+
+    def __len__(self) -> int:
+        return len(self._current)
@@ -0,0 +1,71 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_CACHE_SIZE = 64
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT = " ?？!！。.,，~～…"
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE_RE.sub(" ", query).strip().lower().rstrip(_TRAILING_PUNCT)
+
+class RetrievalCache:
+    """单个用户的检索结果 LRU 缓存。
+
+    version 为该用户的记忆版本，所有记忆写入方（提取、巩固、反思、导入）都调用 invalidate()；
+    缓存对象在用户状态的各个副本间共享，因此并发轮次结束时写回状态也不会丢失失效。
+    """
+
+    def __init__(self, max_entries: int = RETRIEVAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """记忆写入后调用：递增版本并丢弃旧条目"""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def lookup(self, keys: Sequence[Hashable]) -> Optional[Any]:
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+            self.misses += 1
+            return None
+
+    def store(self, keys: Sequence[Hashable], value: Any) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+def retrieval_cache_keys(cache: RetrievalCache, query: str, topic: str, intent: str) -> List[Tuple]:
+    """按查询与主题生成缓存键，均包含意图与缓存当前的记忆版本；
+    检索期间若发生写入，按旧版本存入的结果不会再被命中"""
+    version = cache.version
+    keys = [("query", normalize_query(query), intent, version)]
+    topic = topic.strip()
+    if topic and topic != "未知":
+        keys.append(("topic", topic, intent, version))
+    return keys
@@ -1,80 +1,99 @@
 import os
-from typing import Dict, List, Any, TypedDict, Annotated, Sequence, Tuple, Union
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, TypedDict, Annotated, Tuple, Union
 from datetime import datetime
-from langchain.schema import Document, HumanMessage, AIMessage
-from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain.schema import Document
 from langchain_core.agents import AgentAction, AgentFinish
-from src.config import API_KEY
+from src.config import API_KEY, EMBEDDING_MODEL
+from src.conversation import ConversationLog, LogEntry, ROLE_USER, ROLE_AI
+from src.profile import ProfileStore
+from src.retrieval_cache import RetrievalCache
 import logging
 
 logger = logging.getLogger(__name__)
 
 class State(TypedDict):
-    messages: Annotated[Sequence[Any], "add_messages"]
-    history: List[Dict[str, str]]
-    short_term_memory: List[Dict[str, str]]
+    conversation: ConversationLog
     current_step: int
     last_consolidation: int
+    last_consolidation_time: str
     new_observations: int
     last_reflection: int
     current_query: str
+    query_embedding: Optional[List[float]]
     response: str
     retrieved_memory: List[Document]
-    vector_store: Dict[str, Chroma]
+    retrieval_cache: RetrievalCache
+    vector_store: Dict[str, Any]  # Chroma，延迟导入
+    profile_store: ProfileStore
     uid: str
     search_cache: Dict[str, str]
     current_time: str
     last_reflection_time: str
+    reflection_cursor: Optional[int]
     reflection_interval: int
     current_topic: str
     current_context: str
     img_data_list: List[bytes]
     image_description: str
     input: str
-    chat_history: Sequence[Any]
     agent_outcome: Union[AgentAction, AgentFinish, None]
     intermediate_steps: Annotated[List[Tuple[AgentAction, str]], lambda x, y: x + y]
 
+def user_persist_dir(uid: str) -> str:
+    persist_dir = os.path.abspath(f"hakusai_memory_db/user_{uid}")
+    os.makedirs(persist_dir, exist_ok=True)
+    return persist_dir
+
+@lru_cache(maxsize=None)
+def get_embedding_function():
+    """所有用户共享的嵌入客户端，首次使用时构建"""
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(google_api_key=API_KEY, model=EMBEDDING_MODEL)
+
+def open_vector_store(uid: str):
+    """打开用户的向量库（Chroma）"""
+    from langchain_chroma import Chroma
+    return Chroma(
+        collection_name=f"user_{uid}_memory",
+        embedding_function=get_embedding_function(),
+        persist_directory=user_persist_dir(uid)
+    )
+
 def initialize_state(uid: str) -> State:
     """初始化用户状态"""
     user_states: Dict[str, State] = {}
     if uid not in user_states:
         logger.info(f"Initializing state for new user {uid}")
-        persist_dir = os.path.abspath(f"hakusai_memory_db/user_{uid}")
-        os.makedirs(persist_dir, exist_ok=True)
-
-        embedding_function = GoogleGenerativeAIEmbeddings(google_api_key=API_KEY, model="models/text-embedding-004")
-        vector_store = Chroma(
-            collection_name=f"user_{uid}_memory",
-            embedding_function=embedding_function,
-            persist_directory=persist_dir
-        )
+        vector_store = open_vector_store(uid)
+        profile_store = ProfileStore(user_persist_dir(uid))
 
         current_time = datetime.now()
     return State(
-        messages=[],
-        history=[],
-        short_term_memory=[],
+        conversation=ConversationLog(),
         current_step=0,
         last_consolidation=0,
+        last_consolidation_time=current_time.strftime("%Y-%m-%d %H:%M:%S"),
         new_observations=0,
         last_reflection=0,
         current_query="",
+        query_embedding=None,
         response="",
         retrieved_memory=[],
+        retrieval_cache=RetrievalCache(),
         vector_store={"memory": vector_store},
+        profile_store=profile_store,
         uid=uid,
         search_cache={},
         current_time=current_time.strftime("%Y-%m-%d %H:%M:%S"),
         last_reflection_time=current_time.strftime("%Y-%m-%d %H:%M:%S"),
+        reflection_cursor=None,
         reflection_interval=1,
         current_topic="",
         current_context="",
         img_data_list=[],
         image_description="",
         input="",
-        chat_history=[],
         agent_outcome=None,
         intermediate_steps=[]
     )
\ No newline at end of file
@@ -1,6 +1,5 @@
 import logging
 from langchain_core.tools import tool
-from langchain_google_community import GoogleSearchAPIWrapper
 from src.config import SEARCH_API_KEY, SEARCH_CSE_ID
 
 logger = logging.getLogger(__name__)
@@ -23,6 +22,7 @@ def search(query: str) -> str:
         return user_states[uid]["search_cache"][query]
 
     logger.info(f"Performing Google Search for query: {query}")
+    from langchain_google_community import GoogleSearchAPIWrapper
     search_api_wrapper = GoogleSearchAPIWrapper(
         google_api_key=SEARCH_API_KEY,
         google_cse_id=SEARCH_CSE_ID
@@ -0,0 +1,220 @@
+"""用户记忆的流式导出/导入（JSONL）
+
+用法：
+    python -m src.transfer export <uid> [-o 文件] [--vectors]
+    python -m src.transfer import <uid> [-i 文件]
+
+文件首行为 header，其后每行一条记录：
+    {"kind": "document", "id": ..., "document": ..., "metadata": {...}, "embedding": <base64 float32>}
+    {"kind": "profile", "key": ..., "value": ..., "timestamp": ..., "step": ...}
+"""
+import sys
+import json
+import base64
+import argparse
+import logging
+from array import array
+from typing import TYPE_CHECKING, Any, Dict, IO, Iterable, Iterator, List, Optional
+from src.config import EMBEDDING_MODEL
+from src.maintenance import WRITE_SEQ_KEY
+from src.profile import ProfileStore
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = "hakusai-memory"
+EXPORT_VERSION = 1
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 100
+
+def encode_vector(vector: Iterable[float]) -> str:
+    """向量编码为小端 float32 原始字节块的 base64"""
+    buf = array("f", vector)
+    if sys.byteorder == "big":
+        buf.byteswap()
+    return base64.b64encode(buf.tobytes()).decode("ascii")
+
+def decode_vector(data: str) -> List[float]:
+    buf = array("f")
+    buf.frombytes(base64.b64decode(data))
+    if sys.byteorder == "big":
+        buf.byteswap()
+    return buf.tolist()
+
+def iter_export_batches(vector_store: "Chroma", profile_store: Optional[ProfileStore], uid: str,
+                        with_vectors: bool = False, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """按批分页读取向量库，内存占用与批大小相关而与集合大小无关"""
+    yield [{
+        "kind": "header",
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "uid": uid,
+        "embedding_model": EMBEDDING_MODEL,
+        "vectors": with_vectors,
+    }]
+
+    include = ["documents", "metadatas"] + (["embeddings"] if with_vectors else [])
+    offset = 0
+    while True:
+        result = vector_store.get(limit=batch_size, offset=offset, include=include)
+        ids = result["ids"]
+        if not len(ids):
+            break
+        records = []
+        for i, doc_id in enumerate(ids):
+            record = {
+                "kind": "document",
+                "id": doc_id,
+                "document": result["documents"][i],
+                "metadata": result["metadatas"][i] or {},
+            }
+            if with_vectors:
+                record["embedding"] = encode_vector(result["embeddings"][i])
+            records.append(record)
+        yield records
+        offset += len(ids)
+
+    if profile_store is not None:
+        history = profile_store.history()
+        for start in range(0, len(history), batch_size):
+            yield [{"kind": "profile", **entry._asdict()} for entry in history[start:start + batch_size]]
+
+class MemoryImporter:
+    """缓冲导入记录并按批写入；header 中的嵌入模型与当前一致时直接复用导出的向量"""
+
+    def __init__(self, vector_store: "Chroma", profile_store: Optional[ProfileStore], batch_size: int = IMPORT_BATCH_SIZE):
+        self.vector_store = vector_store
+        self.profile_store = profile_store
+        self.batch_size = batch_size
+        self.reuse_vectors = False
+        self.counts = {"documents": 0, "reused_vectors": 0, "profile": 0, "skipped": 0}
+        self._with_vectors: List[Dict[str, Any]] = []
+        self._to_embed: List[Dict[str, Any]] = []
+        self._profile: List[Dict[str, Any]] = []
+
+    def feed(self, record: Dict[str, Any]) -> None:
+        kind = record.get("kind")
+        if kind == "header":
+            if record.get("format") != EXPORT_FORMAT:
+                raise ValueError(f"不支持的导入格式: {record.get('format')}")
+            self.reuse_vectors = record.get("embedding_model") == EMBEDDING_MODEL
+            if record.get("vectors") and not self.reuse_vectors:
+                logger.info(f"导出嵌入模型 {record.get('embedding_model')} 与当前 {EMBEDDING_MODEL} 不一致，将重新嵌入")
+        elif kind == "document":
+            if self.reuse_vectors and record.get("embedding"):
+                self._with_vectors.append(record)
+            else:
+                self._to_embed.append(record)
+        elif kind == "profile":
+            self._profile.append(record)
+        else:
+            self.counts["skipped"] += 1
+
+    def should_flush(self) -> bool:
+        return len(self._with_vectors) + len(self._to_embed) + len(self._profile) >= self.batch_size
+
+    def _stamp_write_seq(self, batch: List[Dict[str, Any]]) -> None:
+        """导入的记忆按本地写入顺序重新分配序号，使其晚于反思游标而被反思；原序号来自导出方，不可沿用"""
+        seqs = self.profile_store.reserve_sequence(len(batch)) if self.profile_store is not None else None
+        for i, r in enumerate(batch):
+            metadata = dict(r["metadata"] or {})
+            if seqs is None:
+                metadata.pop(WRITE_SEQ_KEY, None)
+            else:
+                metadata[WRITE_SEQ_KEY] = seqs[i]
+            r["metadata"] = metadata
+
+    def flush(self) -> None:
+        if self._with_vectors:
+            batch, self._with_vectors = self._with_vectors, []
+            self._stamp_write_seq(batch)
+            self.vector_store._collection.upsert(
+                ids=[r["id"] for r in batch],
+                embeddings=[decode_vector(r["embedding"]) for r in batch],
+                documents=[r["document"] for r in batch],
+                metadatas=[r["metadata"] or None for r in batch],
+            )
+            self.counts["documents"] += len(batch)
+            self.counts["reused_vectors"] += len(batch)
+        if self._to_embed:
+            batch, self._to_embed = self._to_embed, []
+            self._stamp_write_seq(batch)
+            self.vector_store.add_texts(
+                [r["document"] for r in batch],
+                metadatas=[r["metadata"] for r in batch],
+                ids=[r["id"] for r in batch],
+            )
+            self.counts["documents"] += len(batch)
+        if self._profile:
+            batch, self._profile = self._profile, []
+            if self.profile_store is not None:
+                for r in batch:
+                    self.profile_store.set(r["key"], r["value"], r["timestamp"], r["step"])
+                self.counts["profile"] += len(batch)
+            else:
+                self.counts["skipped"] += len(batch)
+
+def import_records(importer: MemoryImporter, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    for record in records:
+        importer.feed(record)
+        if importer.should_flush():
+            importer.flush()
+    importer.flush()
+    return importer.counts
+
+def _read_jsonl(fp: IO[str]) -> Iterator[Dict[str, Any]]:
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def export_user(uid: str, fp: IO[str], with_vectors: bool = False, batch_size: int = EXPORT_BATCH_SIZE) -> int:
+    from src.state import open_vector_store, user_persist_dir
+    vector_store = open_vector_store(uid)
+    profile_store = ProfileStore(user_persist_dir(uid))
+    count = 0
+    for batch in iter_export_batches(vector_store, profile_store, uid, with_vectors, batch_size):
+        for record in batch:
+            fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += len(batch)
+    return count
+
+def import_user(uid: str, fp: IO[str], batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, int]:
+    from src.state import open_vector_store, user_persist_dir
+    importer = MemoryImporter(open_vector_store(uid), ProfileStore(user_persist_dir(uid)), batch_size)
+    return import_records(importer, _read_jsonl(fp))
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.transfer", description="导出/导入用户记忆")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="导出用户记忆为 JSONL")
+    export_parser.add_argument("uid")
+    export_parser.add_argument("-o", "--output", default="-", help="输出文件，默认标准输出")
+    export_parser.add_argument("--vectors", action="store_true", help="同时导出 float32 向量")
+    export_parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    import_parser = subparsers.add_parser("import", help="从 JSONL 导入用户记忆")
+    import_parser.add_argument("uid")
+    import_parser.add_argument("-i", "--input", default="-", help="输入文件，默认标准输入")
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "export":
+        if args.output == "-":
+            count = export_user(args.uid, sys.stdout, args.vectors, args.batch_size)
+        else:
+            with open(args.output, "w", encoding="utf-8") as fp:
+                count = export_user(args.uid, fp, args.vectors, args.batch_size)
+        logger.info(f"用户 {args.uid} 导出 {count} 条记录")
+    else:
+        if args.input == "-":
+            counts = import_user(args.uid, sys.stdin, args.batch_size)
+        else:
+            with open(args.input, "r", encoding="utf-8") as fp:
+                counts = import_user(args.uid, fp, args.batch_size)
+        logger.info(f"用户 {args.uid} 导入完成: {counts}")
+
+if __name__ == "__main__":
+    main()
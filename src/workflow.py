@@ -1,9 +1,11 @@
 from datetime import datetime
+from functools import lru_cache
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
-from src.state import State, HumanMessage, AIMessage, AgentFinish
+from src.state import State, AgentFinish, ROLE_USER, ROLE_AI
 from src.agent import run_agent, should_continue
 from src.memory import memory_retrieval, extract_memory, consolidation, reflection
+from src.maintenance import should_consolidate, should_reflect
 from src.tools import TOOLS
 import logging
 
@@ -12,31 +14,25 @@ logger = logging.getLogger(__name__)
 def user_input(state: State) -> State:
     query_content = state["current_query"]
     full_content = query_content + (f" [图片描述: {state.get('image_description', '')}]" if state.get("image_description") else "")
-    state["messages"] = state.get("messages", []) + [HumanMessage(content=full_content)]
+    state["conversation"].append(ROLE_USER, full_content)
     state["current_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    state["short_term_memory"] = state["history"][-3:]
     return state
 
 def history_storage(state: State) -> State:
     agent_outcome = state.get("agent_outcome")
     final_response = agent_outcome.return_values.get('output', "没找到答案") if isinstance(agent_outcome, AgentFinish) else state.get("response", "出错了")
     state["response"] = final_response
-    state["messages"] = state.get("messages", []) + [AIMessage(content=final_response)]
-    state["history"] = state.get("history", []) + [{"query": state["current_query"], "response": final_response}]
+    state["conversation"].append(ROLE_AI, final_response)
     state["current_step"] = state.get("current_step", 0) + 1
     return extract_memory(state)
 
 def consolidation_trigger(state: State) -> str:
-    steps_since_last = state["current_step"] - state["last_consolidation"]
-    current_time = datetime.strptime(state["current_time"], "%Y-%m-%d %H:%M:%S")
-    last_reflection_time = datetime.strptime(state["last_reflection_time"], "%Y-%m-%d %H:%M:%S")
-    days_since_last = (current_time - last_reflection_time).days
-    if steps_since_last >= 5 or days_since_last >= state.get("reflection_interval", 1):
+    if should_consolidate(state):
         return "consolidation"
     return "check_reflection"
 
 def reflection_trigger(state: State) -> str:
-    if state.get("new_observations", 0) >= 3:
+    if should_reflect(state):
         return "reflection"
     return END
 
@@ -63,4 +59,7 @@ def build_react_graph():
 
     return workflow.compile()
 
-graph = build_react_graph()
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_graph():
+    """首次处理消息时才编译 LangGraph"""
+    return build_react_graph()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import json
+import threading
+import time
+import unittest
+from unittest import mock
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from src import api
+from src.main import embed_queries
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts, task_type=None):
+        self.calls.append((list(texts), task_type))
+        return [[float(len(text))] for text in texts]
+
+class TestEmbedQueries(unittest.TestCase):
+    def test_single_call_keeps_order(self):
+        fake = FakeEmbeddings()
+        vectors = embed_queries(["a", "", "abc", "ab"], embedding_function=fake)
+        self.assertEqual(vectors, [[1.0], None, [3.0], [2.0]])
+        self.assertEqual(fake.calls, [(["a", "abc", "ab"], "RETRIEVAL_QUERY")])
+
+    def test_all_empty_skips_embedding(self):
+        fake = FakeEmbeddings()
+        self.assertEqual(embed_queries(["", ""], embedding_function=fake), [None, None])
+        self.assertEqual(fake.calls, [])
+
+class TestBatchEndpoint(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        app = web.Application()
+        app.add_routes([web.post("/chat/batch", api.batch_handler)])
+        self.client = TestClient(TestServer(app))
+        await self.client.start_server()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    def fake_process_message(self, uid, message, img_data_list=[], *, query_embedding=None):
+        # 先到的消息睡得更久，若同一用户的消息并发执行则顺序会被打乱
+        time.sleep(0.02 if message.endswith("0") else 0.001)
+        with self.lock:
+            self.calls.append((uid, message, query_embedding))
+        return f"回复:{message}"
+
+    async def post_batch(self, payload, embed=lambda messages: [[1.0]] * len(messages)):
+        with mock.patch.object(api, "process_message", self.fake_process_message), \
+                mock.patch.object(api, "embed_queries", embed):
+            response = await self.client.post("/chat/batch", json=payload)
+            if response.status != 200:
+                return response.status, await response.json()
+            lines = (await response.text()).strip().split("\n")
+            return response.status, [json.loads(line) for line in lines]
+
+    async def test_validation_errors(self):
+        for payload in (
+            [{"uid": "u1", "message": "hi"}],
+            {"items": [{"uid": "u1", "message": "hi"}]},
+            {"api_key": "k", "items": []},
+            {"api_key": "k", "items": [{"message": "no uid"}]},
+            {"api_key": "k", "items": [{"uid": "u1"}], "concurrency": "many"},
+        ):
+            status, body = await self.post_batch(payload)
+            self.assertEqual(status, 400, payload)
+            self.assertIn("error", body)
+
+    async def test_streams_one_line_per_item_in_uid_order(self):
+        items = [{"uid": f"u{i % 2}", "message": f"m{i}0" if i < 2 else f"m{i}"} for i in range(6)]
+        status, lines = await self.post_batch({"api_key": "k", "items": items, "concurrency": 4})
+        self.assertEqual(status, 200)
+        self.assertEqual(sorted(line["index"] for line in lines), list(range(6)))
+        for line in lines:
+            self.assertEqual(line["response"], f"回复:{items[line['index']]['message']}")
+        for uid in ("u0", "u1"):
+            expected = [item["message"] for item in items if item["uid"] == uid]
+            self.assertEqual([message for u, message, _ in self.calls if u == uid], expected)
+        self.assertTrue(all(embedding == [1.0] for _, _, embedding in self.calls))
+
+    async def test_falls_back_per_item_when_embedding_fails(self):
+        def failing_embed(messages):
+            raise RuntimeError("quota exceeded")
+
+        items = [{"uid": "u1", "message": "a"}, {"uid": "u2", "message": "b"}]
+        status, lines = await self.post_batch({"api_key": "k", "items": items}, embed=failing_embed)
+        self.assertEqual(status, 200)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual([embedding for _, _, embedding in self.calls], [None, None])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+from src.conversation import ConversationLog, ROLE_USER, ROLE_AI
+
+class TestConversationLog(unittest.TestCase):
+    def test_turn_views(self):
+        log = ConversationLog()
+        for i in range(5):
+            log.append(ROLE_USER, f"问{i}")
+            log.append(ROLE_AI, f"答{i}")
+        self.assertEqual(log.turn_count, 5)
+        self.assertEqual(list(log.turns(3)), [("问3", "答3"), ("问4", "答4")])
+        self.assertEqual(log.history_text(1), "问: 问4 答: 答4")
+        self.assertEqual([e.content for e in log.recent(3)], ["答3", "问4", "答4"])
+
+    def test_unanswered_query_is_not_a_turn(self):
+        log = ConversationLog()
+        self.assertEqual(log.history_text(3), "无历史")
+        log.append(ROLE_USER, "问0")
+        log.append(ROLE_USER, "问1")
+        log.append(ROLE_AI, "答1")
+        self.assertEqual(log.last_turns(3), [("问1", "答1")])
+        self.assertIs(log.last.role, ROLE_AI)
+
+    def test_roles_are_interned(self):
+        log = ConversationLog()
+        log.append("".join(["us", "er"]), "你好")
+        self.assertIs(log.last.role, ROLE_USER)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import threading
+import time
+import unittest
+from src.llm_gateway import LLMGateway, FOREGROUND, BACKGROUND, is_retryable
+
+class FakeThrottle(Exception):
+    def __init__(self, code=429):
+        super().__init__(f"{code} Resource has been exhausted")
+        self.code = code
+
+class FakeLLM:
+    """前 failures 次调用抛出限流错误，之后返回固定结果"""
+
+    def __init__(self, failures=0, code=429):
+        self.failures = failures
+        self.code = code
+        self.calls = 0
+
+    def invoke(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise FakeThrottle(self.code)
+        return "ok"
+
+class TestLLMGateway(unittest.TestCase):
+    def test_retries_throttling_then_succeeds(self):
+        delays = []
+        gateway = LLMGateway(max_retries=3, base_delay=0.01, sleep=delays.append)
+        fake = FakeLLM(failures=2)
+        self.assertEqual(gateway.call(fake.invoke, caller="intent"), "ok")
+        self.assertEqual(fake.calls, 3)
+        self.assertEqual(len(delays), 2)
+        self.assertEqual(gateway.stats()["intent"]["retries"], 2)
+        self.assertEqual(gateway.stats()["intent"]["calls"], 1)
+
+    def test_gives_up_after_max_retries(self):
+        gateway = LLMGateway(max_retries=2, base_delay=0.01, sleep=lambda _: None)
+        fake = FakeLLM(failures=10, code=503)
+        with self.assertRaises(FakeThrottle):
+            gateway.call(fake.invoke, caller="reflection")
+        self.assertEqual(fake.calls, 3)
+        self.assertEqual(gateway.stats()["reflection"]["failures"], 1)
+
+    def test_non_retryable_error_is_raised_immediately(self):
+        gateway = LLMGateway(sleep=lambda _: None)
+        fake = FakeLLM(failures=1, code=400)
+        with self.assertRaises(FakeThrottle):
+            gateway.call(fake.invoke)
+        self.assertEqual(fake.calls, 1)
+        self.assertFalse(is_retryable(ValueError("bad prompt")))
+
+    def test_foreground_preempts_queued_background(self):
+        gateway = LLMGateway(max_concurrency=1)
+        release = threading.Event()
+        order = []
+
+        def blocker():
+            release.wait(5)
+
+        def record(name):
+            order.append(name)
+
+        first = threading.Thread(target=gateway.call, args=(blocker,), kwargs={"priority": FOREGROUND})
+        first.start()
+        while gateway._active == 0:
+            time.sleep(0.001)
+        background = threading.Thread(target=gateway.call, args=(lambda: record("background"),), kwargs={"priority": BACKGROUND})
+        background.start()
+        while len(gateway._waiting) < 1:
+            time.sleep(0.001)
+        foreground = threading.Thread(target=gateway.call, args=(lambda: record("foreground"),), kwargs={"priority": FOREGROUND})
+        foreground.start()
+        while len(gateway._waiting) < 2:
+            time.sleep(0.001)
+        release.set()
+        for thread in (first, background, foreground):
+            thread.join(5)
+        self.assertEqual(order, ["foreground", "background"])
+
+    def test_background_is_promoted_after_max_wait(self):
+        # 前台调用占住唯一的非预留槽位，后台调用只能在提升优先级后使用预留槽位
+        gateway = LLMGateway(max_concurrency=2, reserved_foreground=1, background_max_wait=0.05)
+        release = threading.Event()
+        holder = threading.Thread(target=gateway.call, args=(lambda: release.wait(5),), kwargs={"priority": FOREGROUND})
+        holder.start()
+        while gateway._active == 0:
+            time.sleep(0.001)
+        start = time.monotonic()
+        self.assertEqual(gateway.call(lambda: "done", priority=BACKGROUND), "done")
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        release.set()
+        holder.join(5)
+
+    def test_slot_released_on_base_exception(self):
+        gateway = LLMGateway(max_concurrency=1)
+
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            gateway.call(interrupted)
+        self.assertEqual(gateway._active, 0)
+        self.assertEqual(gateway.call(lambda: "ok"), "ok")
+
+    def test_token_budget_delays_calls(self):
+        now = [0.0]
+        gateway = LLMGateway(tokens_per_minute=100, clock=lambda: now[0])
+        gateway.call(lambda: "a", estimated_tokens=80)
+        self.assertEqual(gateway._budget_wait(30, now[0]), 60.0)
+        now[0] = 61.0
+        self.assertEqual(gateway._budget_wait(30, now[0]), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from src.maintenance import fetch_records, max_write_seq, plan_since, should_consolidate, should_reflect
+
+class FakeVectorStore:
+    """只实现元数据 get 的假向量库，用于验证游标扫描"""
+
+    def __init__(self, records):
+        self.records = records
+        self.calls = []
+
+    def get(self, where=None, limit=None, offset=0, include=None, ids=None):
+        self.calls.append(where)
+        if ids is not None:
+            # 与 Chroma 一样不保证返回顺序
+            page = [r for r in reversed(self.records) if r[0] in ids]
+        else:
+            cursor = where["$and"][0]["seq"]["$gt"]
+            excluded = where["$and"][1]["type"]["$nin"]
+            # 与 Chroma 一样，缺少 seq 的记录不满足比较条件
+            matched = [r for r in self.records if r[2].get("seq", cursor) > cursor and r[2]["type"] not in excluded]
+            page = matched[offset:offset + limit]
+        return {"ids": [r[0] for r in page], "documents": [r[1] for r in page], "metadatas": [r[2] for r in page]}
+
+def make_state(**overrides):
+    state = {
+        "current_step": 0, "last_consolidation": 0, "new_observations": 0, "reflection_interval": 1,
+        "current_time": "2025-01-01 12:00:00",
+        "last_consolidation_time": "2025-01-01 12:00:00",
+        "last_reflection_time": "2025-01-01 12:00:00",
+    }
+    state.update(overrides)
+    return state
+
+class TestMaintenance(unittest.TestCase):
+    def test_consolidation_is_debounced(self):
+        self.assertFalse(should_consolidate(make_state(current_step=5)))
+        self.assertTrue(should_consolidate(make_state(current_step=5, current_time="2025-01-01 12:10:00")))
+        self.assertTrue(should_consolidate(make_state(current_step=20)))
+
+    def test_idle_trigger_requires_new_turns(self):
+        a_day_later = "2025-01-02 12:00:00"
+        self.assertFalse(should_consolidate(make_state(current_step=3, last_consolidation=3, current_time=a_day_later)))
+        self.assertTrue(should_consolidate(make_state(current_step=4, last_consolidation=3, current_time=a_day_later)))
+
+    def test_reflection_scales_with_new_observations(self):
+        self.assertFalse(should_reflect(make_state(new_observations=0, current_time="2025-01-05 12:00:00")))
+        self.assertFalse(should_reflect(make_state(new_observations=2, current_time="2025-01-01 12:10:00")))
+        self.assertTrue(should_reflect(make_state(new_observations=3, current_time="2025-01-01 12:10:00")))
+
+    def test_plan_since_orders_by_write_seq_after_cursor(self):
+        records = [(f"id{i}", f"doc{i}", {"seq": i, "timestamp": 100.0, "type": "observation"}) for i in (6, 3, 5, 1, 4)]
+        records.append(("insight", "洞察", {"seq": 10, "timestamp": 100.0, "type": "insight"}))
+        records.append(("legacy", "旧记忆", {"timestamp": 100.0, "type": "observation"}))
+        store = FakeVectorStore(records)
+        batches, remaining = plan_since(store, 2, batch_size=3, max_batches=5)
+        self.assertEqual(batches, [["id3", "id4", "id5"], ["id6"]])
+        self.assertEqual(remaining, 0)
+        self.assertEqual([r["id"] for r in fetch_records(store, batches[0])], ["id3", "id4", "id5"])
+
+    def test_plan_since_caps_batches(self):
+        records = [(f"id{i}", f"doc{i}", {"seq": i + 1, "timestamp": 100.0, "type": "observation"}) for i in range(6)]
+        store = FakeVectorStore(records)
+        batches, remaining = plan_since(store, 0, batch_size=2, max_batches=2)
+        self.assertEqual(batches, [["id0", "id1"], ["id2", "id3"]])
+        self.assertEqual(remaining, 2)
+        cursor = max_write_seq(fetch_records(store, batches[-1]), 0)
+        batches, remaining = plan_since(store, cursor, batch_size=2, max_batches=2)
+        self.assertEqual(batches, [["id4", "id5"]])
+        self.assertEqual(remaining, 0)
+
+    def test_write_at_cursor_timestamp_after_reflection_is_picked_up(self):
+        # 同一秒内先写入、反思、再写入：时间戳相同，但写入序号更大
+        store = FakeVectorStore([("a", "喜欢蓝色", {"seq": 1, "timestamp": 100.0, "type": "preference"})])
+        batches, _ = plan_since(store, 0)
+        cursor = max_write_seq(fetch_records(store, batches[0]), 0)
+        store.records.append(("b", "喜欢猫", {"seq": 2, "timestamp": 100.0, "type": "preference"}))
+        self.assertEqual(plan_since(store, cursor), ([["b"]], 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import tempfile
+import unittest
+from src.profile import ProfileStore, parse_profile_item
+
+class TestProfileStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_last_write_wins_with_history(self):
+        store = ProfileStore(self.tmp.name)
+        store.set("姓名", "小明", 1.0, 1)
+        store.set("名字", "小红", 2.0, 2)
+        self.assertEqual(store.get("姓名").value, "小红")
+        self.assertEqual([e.value for e in store.history("姓名")], ["小明", "小红"])
+
+    def test_older_write_keeps_newer_value(self):
+        store = ProfileStore(self.tmp.name)
+        store.set("姓名", "小红", 100.0, 2)
+        self.assertEqual(store.set("姓名", "小明", 50.0, 1).value, "小红")
+        self.assertEqual(store.get("姓名").value, "小红")
+        self.assertEqual(ProfileStore(self.tmp.name).get("姓名").value, "小红")
+
+    def test_duplicate_history_rows_are_skipped(self):
+        store = ProfileStore(self.tmp.name)
+        store.set("姓名", "小红", 100.0, 2)
+        store.set("姓名", "小明", 50.0, 1)
+        store.set("姓名", "小明", 50.0, 1)
+        self.assertEqual([e.value for e in store.history("姓名")], ["小红", "小明"])
+
+    def test_reload_from_disk(self):
+        ProfileStore(self.tmp.name).set("城市", "北京", 1.0, 1)
+        store = ProfileStore(self.tmp.name)
+        self.assertEqual(store.get("所在地").value, "北京")
+        self.assertEqual(store.format(), "所在地=北京")
+
+    def test_meta_persists(self):
+        store = ProfileStore(self.tmp.name)
+        self.assertIsNone(store.get_meta("reflection_cursor"))
+        store.set_meta("reflection_cursor", 12.5)
+        store.set_meta("reflection_cursor", 20.0)
+        self.assertEqual(ProfileStore(self.tmp.name).get_meta("reflection_cursor"), 20.0)
+        self.assertEqual(len(store), 0)
+
+    def test_reserve_sequence_is_monotonic_across_reloads(self):
+        store = ProfileStore(self.tmp.name)
+        self.assertEqual(list(store.reserve_sequence(3)), [1, 2, 3])
+        self.assertEqual(list(ProfileStore(self.tmp.name).reserve_sequence(2)), [4, 5])
+        self.assertEqual(list(store.reserve_sequence(0)), [])
+        self.assertEqual(list(store.reserve_sequence(1)), [6])
+
+    def test_parse_profile_item(self):
+        self.assertEqual(parse_profile_item("姓名=小明"), ("姓名", "小明"))
+        self.assertIsNone(parse_profile_item("喜欢蓝色"))
+        self.assertIsNone(parse_profile_item("姓名="))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from src.retrieval_cache import RetrievalCache, normalize_query, retrieval_cache_keys
+
+class TestRetrievalCache(unittest.TestCase):
+    def test_follow_up_on_same_topic_hits(self):
+        cache = RetrievalCache()
+        cache.store(retrieval_cache_keys(cache, "今天天气咋样？", "天气", "request_info"), ["doc"])
+        self.assertEqual(cache.lookup(retrieval_cache_keys(cache, "  今天天气咋样 ", "未知", "request_info")), ["doc"])
+        self.assertEqual(cache.lookup(retrieval_cache_keys(cache, "那明天呢", "天气", "request_info")), ["doc"])
+        self.assertIsNone(cache.lookup(retrieval_cache_keys(cache, "那明天呢", "天气", "general_chat")))
+
+    def test_invalidate_bumps_version(self):
+        cache = RetrievalCache()
+        cache.store(retrieval_cache_keys(cache, "你好", "问候", "general_chat"), ["doc"])
+        cache.invalidate()
+        self.assertEqual(cache.version, 1)
+        self.assertIsNone(cache.lookup(retrieval_cache_keys(cache, "你好", "问候", "general_chat")))
+
+    def test_store_after_concurrent_invalidate_is_not_served(self):
+        cache = RetrievalCache()
+        keys = retrieval_cache_keys(cache, "你好", "问候", "general_chat")
+        cache.invalidate()
+        cache.store(keys, ["stale"])
+        self.assertIsNone(cache.lookup(retrieval_cache_keys(cache, "你好", "问候", "general_chat")))
+
+    def test_lru_eviction(self):
+        cache = RetrievalCache(max_entries=2)
+        cache.store([("a",)], 1)
+        cache.store([("b",)], 2)
+        cache.lookup([("a",)])
+        cache.store([("c",)], 3)
+        self.assertIsNone(cache.lookup([("b",)]))
+        self.assertEqual(cache.lookup([("a",)]), 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query(" Hello   World?! "), "hello world")
+
+if __name__ == "__main__":
+    unittest.main()
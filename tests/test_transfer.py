@@ -0,0 +1,142 @@
+import tempfile
+import unittest
+from src.config import EMBEDDING_MODEL
+from src.profile import ProfileStore
+from src.transfer import (EXPORT_FORMAT, MemoryImporter, decode_vector, encode_vector,
+                          import_records, iter_export_batches)
+
+class FakeCollection:
+    def __init__(self):
+        self.upserts = []
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.upserts.append({"ids": ids, "embeddings": embeddings, "documents": documents, "metadatas": metadatas})
+
+class FakeVectorStore:
+    """内存中的假向量库，实现导出/导入用到的 get、add_texts 与 _collection.upsert"""
+
+    def __init__(self, records=()):
+        self.records = list(records)
+        self.get_calls = []
+        self.added = []
+        self._collection = FakeCollection()
+
+    def get(self, limit=None, offset=0, include=None):
+        self.get_calls.append((limit, offset))
+        page = self.records[offset:offset + limit]
+        result = {"ids": [r["id"] for r in page], "documents": [r["document"] for r in page],
+                  "metadatas": [r["metadata"] for r in page]}
+        if "embeddings" in include:
+            result["embeddings"] = [r["embedding"] for r in page]
+        return result
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        self.added.append({"texts": texts, "metadatas": metadatas, "ids": ids})
+
+def make_records(n):
+    return [{"id": f"id{i}", "document": f"doc{i}", "metadata": {"type": "preference", "step": i},
+             "embedding": [float(i), 0.5, -1.25]} for i in range(n)]
+
+def header(model=EMBEDDING_MODEL, vectors=True):
+    return {"kind": "header", "format": EXPORT_FORMAT, "embedding_model": model, "vectors": vectors}
+
+class TestTransfer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_vector_round_trip(self):
+        vector = [0.0, 1.5, -2.25, 3.0e-3]
+        decoded = decode_vector(encode_vector(vector))
+        self.assertEqual(len(decoded), len(vector))
+        for a, b in zip(decoded, vector):
+            self.assertAlmostEqual(a, b, places=6)
+
+    def test_export_pages_documents_and_profile_history(self):
+        store = FakeVectorStore(make_records(5))
+        profile = ProfileStore(self.tmp.name)
+        profile.set("姓名", "小明", 1.0, 1)
+        profile.set("姓名", "小红", 2.0, 2)
+        batches = list(iter_export_batches(store, profile, "u1", with_vectors=True, batch_size=2))
+
+        self.assertEqual(batches[0][0]["kind"], "header")
+        self.assertEqual([len(b) for b in batches[1:4]], [2, 2, 1])
+        self.assertEqual([offset for _, offset in store.get_calls], [0, 2, 4, 5])
+        documents = [r for b in batches[1:4] for r in b]
+        self.assertEqual([r["id"] for r in documents], [f"id{i}" for i in range(5)])
+        self.assertEqual(decode_vector(documents[3]["embedding"]), [3.0, 0.5, -1.25])
+        self.assertEqual([(r["key"], r["value"]) for r in batches[4]], [("姓名", "小明"), ("姓名", "小红")])
+
+    def test_export_round_trip_reuses_vectors_when_model_matches(self):
+        source = FakeVectorStore(make_records(3))
+        records = [r for b in iter_export_batches(source, None, "u1", with_vectors=True) for r in b]
+        target = FakeVectorStore()
+        counts = import_records(MemoryImporter(target, None), records)
+
+        self.assertEqual(counts["reused_vectors"], 3)
+        self.assertEqual(target.added, [])
+        upsert = target._collection.upserts[0]
+        self.assertEqual(upsert["ids"], ["id0", "id1", "id2"])
+        self.assertEqual(upsert["embeddings"][2], [2.0, 0.5, -1.25])
+
+    def test_reembeds_when_model_differs(self):
+        target = FakeVectorStore()
+        records = [header(model="models/other")] + [
+            {"kind": "document", "id": "a", "document": "喜欢蓝色", "metadata": {"type": "preference"},
+             "embedding": encode_vector([1.0, 2.0])}
+        ]
+        counts = import_records(MemoryImporter(target, None), records)
+
+        self.assertEqual(counts, {"documents": 1, "reused_vectors": 0, "profile": 0, "skipped": 0})
+        self.assertEqual(target._collection.upserts, [])
+        self.assertEqual(target.added, [{"texts": ["喜欢蓝色"], "metadatas": [{"type": "preference"}], "ids": ["a"]}])
+
+    def test_imported_documents_get_local_write_seq(self):
+        profile = ProfileStore(self.tmp.name)
+        profile.reserve_sequence(10)
+        source = make_records(2)
+        for i, r in enumerate(source):
+            r["metadata"]["seq"] = 500 + i
+        records = [r for b in iter_export_batches(FakeVectorStore(source), None, "u1", with_vectors=True) for r in b]
+        target = FakeVectorStore()
+        import_records(MemoryImporter(target, profile), records)
+        self.assertEqual([m["seq"] for m in target._collection.upserts[0]["metadatas"]], [11, 12])
+
+        target = FakeVectorStore()
+        import_records(MemoryImporter(target, None), records)
+        self.assertNotIn("seq", target._collection.upserts[0]["metadatas"][0])
+
+    def test_wrong_format_raises(self):
+        importer = MemoryImporter(FakeVectorStore(), None)
+        with self.assertRaises(ValueError):
+            importer.feed({"kind": "header", "format": "something-else"})
+
+    def test_flush_batches(self):
+        target = FakeVectorStore()
+        profile = ProfileStore(self.tmp.name)
+        importer = MemoryImporter(target, profile, batch_size=3)
+        importer.feed(header(vectors=False))
+        importer.feed({"kind": "document", "id": "a", "document": "a", "metadata": {}})
+        importer.feed({"kind": "profile", "key": "城市", "value": "北京", "timestamp": 1.0, "step": 1})
+        self.assertFalse(importer.should_flush())
+        importer.feed({"kind": "document", "id": "b", "document": "b", "metadata": {}})
+        self.assertTrue(importer.should_flush())
+
+        importer.flush()
+        self.assertFalse(importer.should_flush())
+        self.assertEqual(target.added[0]["ids"], ["a", "b"])
+        self.assertEqual(profile.get("所在地").value, "北京")
+        importer.flush()
+        self.assertEqual(len(target.added), 1)
+
+    def test_reimporting_old_profile_keeps_newer_value(self):
+        profile = ProfileStore(self.tmp.name)
+        profile.set("姓名", "小红", 100.0, 2)
+        backup = [header(vectors=False), {"kind": "profile", "key": "姓名", "value": "小明", "timestamp": 50.0, "step": 1}]
+        for _ in range(2):
+            import_records(MemoryImporter(FakeVectorStore(), profile), backup)
+        self.assertEqual(profile.get("姓名").value, "小红")
+        self.assertEqual([e.value for e in profile.history("姓名")], ["小红", "小明"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,16 @@
 import gradio as gr
+from typing import TYPE_CHECKING
 from src.main import process_message
-from src.state import State
 import logging
 from datetime import datetime
 
+if TYPE_CHECKING:
+    from src.state import State
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def chat_handler(message: str, image: bytes, history: list, state: State = None) -> tuple[str, bytes, list, str]:
+def chat_handler(message: str, image: bytes, history: list, state: "State" = None) -> tuple[str, bytes, list, str]:
     """处理用户输入并返回聊天历史和日志"""
     uid = "user123"
     img_data_list = [image] if image else []